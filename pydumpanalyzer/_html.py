@@ -1,13 +1,17 @@
 ''' this is the home for various html helpers '''
 
-from utility import getUniqueId
+import itertools
+
 from csmlog_setup import getLogger
 
 logger = getLogger(__file__)
 
+# table ids only need to be unique within a page (for the search js), so a counter is plenty
+_tableIdCounter = itertools.count()
+
 def getHtmlLinkString(url, text):
     ''' given a url/text returns an a '''
-    return r'<a href="%s">%s</a>' % (url, text)
+    return f'<a href="{url}">{text}</a>'
 
 def getDropLeft(title, textCommaLinks):
     ''' returns text for a bootstrap 4 dropleft '''
@@ -20,9 +24,11 @@ def getDropLeft(title, textCommaLinks):
             %s
         </div>
     </div>
-    ''' % (title, ('\n'.join([('<a class="dropdown-item" href="%s">%s</a>' % (val[1], val[0])) for val in textCommaLinks])))
+    ''' % (title, '\n'.join(f'<a class="dropdown-item" href="{link}">{text}</a>' for text, link in textCommaLinks))
 
-SEARCH_CODE = '''
+def _renderSearchCode(id, classes):
+    ''' returns the search box (and its jquery) for the table with the given id '''
+    return f'''
 <script src="https://ajax.googleapis.com/ajax/libs/jquery/3.4.1/jquery.min.js"></script>
 <script>
 // This is code for search
@@ -39,7 +45,9 @@ $(document).ready(function(){{
 <input id="input_{id}" type="text" placeholder="Search..." class="{classes}">
 '''
 
-TABLE_CONTENT = '''
+def _renderTableContent(id, rows, headers, classes):
+    ''' returns the table itself given already rendered rows/headers '''
+    return f'''
 <table style="width:100%;" class="{classes}">
     <thead style="text-align: left">
         {headers}
@@ -50,7 +58,9 @@ TABLE_CONTENT = '''
 </table
 '''
 
-FULL_CONTENT = '''
+def _renderFullContent(classes, searchCode, tableContent, name):
+    ''' returns the full content for a table (name, search, table) '''
+    return f'''
 <h2 class="{classes}">{name}</h2>
 <div class="{classes}" style="border: 1px solid black;">
 {searchCode}
@@ -59,16 +69,46 @@ FULL_CONTENT = '''
 '''
 
 class HtmlTable(object):
-    ''' this object is used to create an HTML table, with optional search functionality '''
+    ''' this object is used to create an HTML table, with optional search functionality.
+    The html is cached after rendering. Setting rows/tableHeaders (or using the modifying methods) clears
+    that cache, but changing name/addSearch/classes or editing rows in place after rendering is not picked up. '''
     def __init__(self, tableHeaders, name=None, addSearch=True, classes=None):
         ''' initializer for html table object '''
+        # the last result of __html__(), cleared by anything modifying the table
+        self._cachedHtml = None
+
         self.tableHeaders = tableHeaders
         self.name = name if name is not None else ''
         self.addSearch = addSearch
         self.classes = classes if classes is not None else ''
-        self.id = getUniqueId()
+        self.id = f'tbl{next(_tableIdCounter)}'
         self.rows = []
 
+        # id/classes don't change after init, so the search code only needs rendering once
+        self._cachedSearchCode = None
+
+    @property
+    def rows(self):
+        ''' the list of rows (each a list of cells) in this table '''
+        return self._rows
+
+    @rows.setter
+    def rows(self, rows):
+        ''' sets the rows for this table (clearing the cached html) '''
+        self._rows = rows
+        self._cachedHtml = None
+
+    @property
+    def tableHeaders(self):
+        ''' the list of headers for this table '''
+        return self._tableHeaders
+
+    @tableHeaders.setter
+    def tableHeaders(self, tableHeaders):
+        ''' sets the headers for this table (clearing the cached html) '''
+        self._tableHeaders = tableHeaders
+        self._cachedHtml = None
+
     @classmethod
     def fromCursor(cls, cursor, name=None, addSearch=True, classes=None):
         ''' helper to get an HtmlTable from a database cursor '''
@@ -76,14 +116,14 @@ class HtmlTable(object):
             logger.error("Cursor appears to be invalid")
             return False
 
-        results = cursor.fetchall()
-        if not results:
-            logger.warning("Empty results from valid cursor")
-
-        tableHeaders = [a[0] for a in cursor.description]
+        description = cursor.description
+        tableHeaders = [a[0] for a in description]
         retTable = HtmlTable(tableHeaders=tableHeaders, name=name, addSearch=addSearch, classes=classes)
-        for result in results:
-            retTable.addRow(list(result))
+
+        # every row from the cursor matches the headers, so skip addRow()'s per-row validation
+        retTable.rows = [list(result) for result in cursor]
+        if not retTable.rows:
+            logger.warning("Empty results from valid cursor")
 
         return retTable
 
@@ -94,28 +134,23 @@ class HtmlTable(object):
             raise ValueError("number of items in a row (%d) must match number of items in tableHeaders (%d)" % (len(row), len(self.tableHeaders)))
 
         self.rows.append(row)
+        self._cachedHtml = None
 
     def modifyAllRows(self, func):
         ''' will go through all rows and call the given function on each row.
         The function should return the modified version of the row to replace in the table'''
-        for idx, row in enumerate(self.rows):
-            self.rows[idx] = func(row)
+        self.rows = [func(row) for row in self.rows]
 
     def removeColumns(self, columnNames):
         ''' hides the given columns (by header name) from the table (by removing respective cells) '''
         if not isinstance(columnNames, (list, tuple)):
             columnNames = [columnNames]
 
-        indexes = sorted([self.tableHeaders.index(c) for c in columnNames], reverse=True)
-
-        def deleter(row):
-            ''' deletes calculated indexes from the given row '''
-            for idx in indexes:
-                del row[idx]
-            return row
+        removedIndexes = set([self.tableHeaders.index(c) for c in columnNames])
+        keptIndexes = [idx for idx in range(len(self.tableHeaders)) if idx not in removedIndexes]
 
-        deleter(self.tableHeaders)
-        self.modifyAllRows(deleter)
+        self.tableHeaders = [self.tableHeaders[idx] for idx in keptIndexes]
+        self.rows = [[row[idx] for idx in keptIndexes] for row in self.rows]
 
     def getCellFromRow(self, row, columnName):
         ''' gets a given cell from a row and the desired columnName '''
@@ -125,32 +160,37 @@ class HtmlTable(object):
     def addColumn(self, headerName):
         ''' add a column to the table (with a given name) '''
         self.tableHeaders.append(headerName)
-        self.modifyAllRows(lambda row: row + [None])
+        self.rows = [row + [None] for row in self.rows]
 
     def __html__(self):
-        ''' general purpose to-html method for this table '''
+        ''' general purpose to-html method for this table.
+        The result is cached until rows/tableHeaders are set or the table is modified via one of its methods. '''
+        if self._cachedHtml is not None:
+            return self._cachedHtml
+
         searchCode = ''
         if self.addSearch:
-            searchCode += SEARCH_CODE.format(id=self.id, classes=self.classes)
+            if self._cachedSearchCode is None:
+                self._cachedSearchCode = _renderSearchCode(self.id, self.classes)
+            searchCode = self._cachedSearchCode
 
-        headerText = '<tr>\n'
+        headerParts = ['<tr>\n']
+        append = headerParts.append
         for row in self.tableHeaders:
-            headerText += '<th>%s</th>\n' % (row)
-        headerText += '</tr>\n'
+            append(f'<th>{row}</th>\n')
+        append('</tr>\n')
+        headerText = ''.join(headerParts)
 
         if self.rows:
-            rowText = ''
-            for row in reversed(self.rows):
-                rowText += '<tr>\n'
-                for colIdx, value in enumerate(row):
-                    rowText += '<td>%s</td>\n' % (value)
-                rowText += '</tr>\n'
+            # one chunk per row (rather than one per cell/tag), all joined at once
+            rowText = ''.join(['<tr>\n' + ''.join([f'<td>{value}</td>\n' for value in row]) + '</tr>\n' for row in reversed(self.rows)])
         else:
             rowText = '... Table is empty (no rows)'
 
-        tableContent = TABLE_CONTENT.format(id=self.id, rows=rowText, headers=headerText, classes=self.classes)
+        tableContent = _renderTableContent(self.id, rowText, headerText, self.classes)
 
-        retStr = FULL_CONTENT.format(classes=self.classes, searchCode=searchCode, tableContent=tableContent, name=self.name)
+        retStr = _renderFullContent(self.classes, searchCode, tableContent, self.name)
+        self._cachedHtml = retStr
         return retStr
 
 
@@ -52,6 +52,25 @@ def test_class_can_be_set():
     table = HtmlTable(['A', 'B', 'C'], classes=CLASSNAME)
     assert ('class=\"%s\"' % CLASSNAME) in table.__html__()
 
+def test_html_updates_after_modification():
+    ''' ensures the cached html is not reused after the table changes '''
+    table = HtmlTable(['A', 'B', 'C'])
+    html = table.__html__()
+    assert table.__html__() is html
+
+    table.addRow(['One', 'Two', 'Three'])
+    assert 'Two' in table.__html__()
+
+    table.addColumn('D')
+    assert 'D</th>' in table.__html__()
+
+    table.rows = [['Four', 'Five', 'Six', 'Seven']]
+    assert 'Seven' in table.__html__()
+    assert 'Two' not in table.__html__()
+
+    table.tableHeaders = ['W', 'X', 'Y', 'Z']
+    assert 'Z</th>' in table.__html__()
+
 def test_can_set_name():
     ''' ensures we can set the name on a table '''
     table = HtmlTable(['A', 'B', 'C'], name="TheName")
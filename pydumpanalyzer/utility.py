@@ -6,11 +6,22 @@ import os
 import shutil
 import tempfile
 import uuid
+import zipfile
 
 from csmlog_setup import getLogger
 
 logger = getLogger(__file__)
 
+# used with str.translate() to escape text in a single pass
+_HTML_ESCAPE_TABLE = str.maketrans({
+    '&' : '&amp;',
+    '<' : '&lt;',
+    '>' : '&gt;',
+    '"' : '&quot;',
+    '\n' : '<br>',
+    ' ' : '&nbsp;',
+})
+
 def getUniqueId():
     ''' gets a unique id string '''
     return str(uuid.uuid4())
@@ -25,15 +36,11 @@ def temporaryFilePath(delete=True, fileName=None):
     ''' yields a path we can use for temp files... will attempt to delete it after use.
     This function will create a directory in the tempdir to ensure we can use names as we please (and not conflict
     with other threads, etc.) '''
-    folderPath = None
-    while True:
-        folderPath = os.path.join(tempfile.gettempdir(), 'pda_' + getUniqueId())
-        if not os.path.exists(folderPath):
-            break
-
-    os.mkdir(folderPath)
+    # mkdtemp() atomically creates a uniquely named directory for us
+    folderPath = tempfile.mkdtemp(prefix='pda_')
     if fileName is None:
-        fileName = 'pda_' + getUniqueId()
+        # the directory is ours alone, so this doesn't need to be unique
+        fileName = 'pda_temp'
     path = os.path.join(folderPath, fileName)
     try:
         yield path
@@ -43,14 +50,24 @@ def temporaryFilePath(delete=True, fileName=None):
 
 def textToSafeHtmlText(s):
     ''' coerces a string into html-safe text '''
-    return s.replace(' ', '&nbsp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br>')
+    return s.translate(_HTML_ESCAPE_TABLE)
 
 def zipDirectoryToBytesIo(directory):
     ''' zips a directory and returns a io.BytesIO object '''
-    with temporaryFilePath() as tempPath:
-        shutil.make_archive(tempPath, 'zip', directory)
-        with open(tempPath + '.zip', 'rb') as f:
-            fullBinaryBytesIo = io.BytesIO(f.read())
-            fullBinaryBytesIo.seek(0)
+    fullBinaryBytesIo = io.BytesIO()
+    with zipfile.ZipFile(fullBinaryBytesIo, 'w', zipfile.ZIP_DEFLATED) as zipFile:
+        # entries/order match what shutil.make_archive would do
+        for root, dirs, files in os.walk(directory):
+            # add directories too so empty ones are kept
+            for name in sorted(dirs):
+                fullPath = os.path.join(root, name)
+                zipFile.write(fullPath, os.path.relpath(fullPath, directory))
+
+            for name in files:
+                fullPath = os.path.join(root, name)
+                # skip things like broken symlinks or fifos
+                if os.path.isfile(fullPath):
+                    zipFile.write(fullPath, os.path.relpath(fullPath, directory))
 
-        return fullBinaryBytesIo
+    fullBinaryBytesIo.seek(0)
+    return fullBinaryBytesIo
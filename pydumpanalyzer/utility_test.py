@@ -29,6 +29,7 @@ def test_safe_html():
     ''' ensures our safe text method works '''
     assert textToSafeHtmlText('\n ') == '<br>&nbsp;'
     assert textToSafeHtmlText('<>\n') == '&lt;&gt;<br>'
+    assert textToSafeHtmlText('a&"b') == 'a&amp;&quot;b'
 
 def test_temp_file_path_with_a_file():
     ''' ensures temporaryFilePaths() can be created and delete appropriately with a file '''
@@ -1,11 +1,13 @@
 ''' this contains the implementation for the WinDbg Debugger '''
 
+import locale
+import logging
+import mmap
 import os
 import re
 import subprocess
 import sys
 import tempfile
-import time
 
 from csmlog_setup import getLogger
 from debugger import Debugger
@@ -15,15 +17,30 @@ from variable import Variable
 from windows_symbol_store import WindowsSymbolStore
 
 MAX_STACK_DEPTH = 100
+CDB_TIMEOUT_SECONDS = 60
 REGEX_FILE_AND_LINE_FROM_FRAME = re.compile(r'\[(.*)@\s*(\d+)')
+REGEX_VARIABLE_FROM_DV_LINE = re.compile(r'^(?P<type>.+?)\s+(?P<name>\S+)\s*=\s*(?P<value>.*)$')
 DOWNSTREAM_TEMP_SYMBOLS = os.path.join(tempfile.gettempdir(), "DownstreamSymbols")
 
+# enable line numbers (since we need to do this to enable them for cdb. windbg has this enabled automatically)
+# see https://social.msdn.microsoft.com/Forums/en-US/a72dbabf-f8e2-4937-821e-a7ed37d41797/why-is-windbg-and-cdb-show-different-output-when-looking-at-the-stack-for-a-dump-file?forum=vsdebug
+PREAMBLE_COMMANDS = ['.symopt+0x10']
+PREAMBLE_COMMANDS_WITH_EXCEPTION_CONTEXT = PREAMBLE_COMMANDS + ['.ecxr']
+
 # think py2 would need this
 if not hasattr(subprocess, 'DEVNULL'):
     subprocess.DEVNULL = open(os.devnull)
 
 logger = getLogger(__file__)
 
+def _decodeLog(data):
+    ''' turns raw bytes from a cdb log into text (the same as reading it in text mode would) '''
+    return data.decode(locale.getpreferredencoding(False)).replace('\r\n', '\n')
+
+def _encodeLog(text):
+    ''' turns text into bytes that can be searched for in a raw cdb log '''
+    return text.encode(locale.getpreferredencoding(False))
+
 class WinDbg(Debugger):
     CDB_DBG_PATH = r'C:\Program Files (x86)\Windows Kits\10\Debuggers\x86\cdb.exe'
     def _platformSetup(self):
@@ -45,44 +62,37 @@ class WinDbg(Debugger):
 
     def _startWinDbg(self):
         windbgRealPath = os.path.join(os.path.dirname(self.CDB_DBG_PATH), 'windbg.exe')
-        return self._callWinDbg(debugCommandsList=[], exitAfterCommands=False, exeOverload=windbgRealPath, timeout=100000000000)
+        return self._callWinDbg(debugCommandsList=[], exitAfterCommands=False, exeOverload=windbgRealPath, timeout=None)
 
-    def _callWinDbg(self, debugCommandsList, gotoExceptionContext=True, printHeaderFooter=True, exitAfterCommands=True, getJustCommandOutput=True, exeOverload=None, timeout=60):
+    def _callWinDbg(self, debugCommandsList, gotoExceptionContext=True, printHeaderFooter=True, exitAfterCommands=True, getJustCommandOutput=True, exeOverload=None, timeout=CDB_TIMEOUT_SECONDS):
         if isinstance(debugCommandsList, str):
             debugCommandsList = [debugCommandsList]
 
+        preamble = PREAMBLE_COMMANDS_WITH_EXCEPTION_CONTEXT if gotoExceptionContext else PREAMBLE_COMMANDS
+        debugCommandsList = preamble + debugCommandsList
         if exitAfterCommands:
             debugCommandsList.append('q')
 
-        if gotoExceptionContext:
-            debugCommandsList = ['.ecxr'] + debugCommandsList
-
-        # enable line numbers (since we need to do this to enable them for cdb. windbg has this enabled automatically)
-        # see https://social.msdn.microsoft.com/Forums/en-US/a72dbabf-f8e2-4937-821e-a7ed37d41797/why-is-windbg-and-cdb-show-different-output-when-looking-at-the-stack-for-a-dump-file?forum=vsdebug
-        debugCommandsList = ['.symopt+0x10'] + debugCommandsList
-
         outputHeader = None
         outputFooter = None
         if printHeaderFooter:
             finalCommandList = []
-            for dc in debugCommandsList:
-                finalCommandList.append('.echo == Start Calling %s ==' % dc)
-
-                # only set header once
-                if outputHeader is None:
+            append = finalCommandList.append
+            for idx, dc in enumerate(debugCommandsList):
+                start = '== Start Calling %s ==' % dc
+                append('.echo ' + start)
 
-                    # if this was auto added, don't consider it part of this.
-                    if (not (gotoExceptionContext and dc == '.ecxr')) and dc != '.symopt+0x10':
-                        outputHeader = finalCommandList[-1].split('.echo ', 1)[1]
+                # only set header once (and don't consider the auto added preamble part of this)
+                if outputHeader is None and idx >= len(preamble):
+                    outputHeader = start
 
-                finalCommandList.append(dc)
+                append(dc)
 
                 # Don't add a command after quit.
                 if dc != 'q':
-                    finalCommandList.append('.echo == End Calling %s ==' % dc)
-
                     # always overwrite footer
-                    outputFooter = finalCommandList[-1].split('.echo ', 1)[1]
+                    outputFooter = '== End Calling %s ==' % dc
+                    append('.echo ' + outputFooter)
 
             debugCommandsList = finalCommandList
 
@@ -112,28 +122,51 @@ class WinDbg(Debugger):
             logger.debug("About to call: %s" % args)
             process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-            deathTime = time.time() + timeout
-            process.poll()
-            while deathTime > time.time():
-                if process.returncode is None:
-                    time.sleep(.01)
-                    process.poll()
-                else:
-                    break
-            else:
+            try:
+                # a timeout of None waits forever
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
                 process.terminate()
                 raise RuntimeError("Timed out doing this command list: %s" % debugCommandsList)
 
-            fullOutput = ''
-            if os.path.exists(tempFile.name):
-                with open(tempFile.name, 'r') as f:
-                    fullOutput = f.read()
-
-            if process.returncode != 0:
-                logger.error("cdb error!\n%s" % fullOutput)
-                raise subprocess.CalledProcessError(process.returncode, args)
+            # map the log instead of reading it all in, often we only need a slice of it
+            try:
+                with open(tempFileName, 'rb') as f:
+                    rawOutput = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                # ValueError is raised when trying to map an empty file
+                rawOutput = b''
 
-            logger.debug("Output:\n%s" % fullOutput)
+            try:
+                if process.returncode != 0:
+                    logger.error("cdb error!\n%s" % _decodeLog(rawOutput[:]))
+                    raise subprocess.CalledProcessError(process.returncode, args)
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Output:\n%s" % _decodeLog(rawOutput[:]))
+
+                # used to get rid of output we don't need
+                if getJustCommandOutput and outputHeader and outputFooter:
+                    # find the boundaries in the raw bytes so only the needed slice gets decoded
+                    header = _encodeLog(outputHeader)
+                    cmds = _encodeLog(cmdsWithSemiColons)
+                    start = rawOutput.find(cmds)
+                    if start != -1:
+                        start = rawOutput.find(header, start + len(cmds))
+                    if start == -1:
+                        raise ValueError("Could not find the command output in the cdb log")
+                    start += len(header)
+
+                    end = rawOutput.find(_encodeLog(outputFooter), start)
+                    if end == -1:
+                        end = len(rawOutput)
+
+                    fullOutput = outputHeader + '\n' + _decodeLog(rawOutput[start:end]) + '\n' + outputFooter
+                else:
+                    fullOutput = _decodeLog(rawOutput[:])
+            finally:
+                if isinstance(rawOutput, mmap.mmap):
+                    rawOutput.close()
 
         finally:
             if os.path.isfile(tempFileName):
@@ -142,14 +175,6 @@ class WinDbg(Debugger):
                 except OSError:
                     pass
 
-        # used to get rid of output we don't need
-        if getJustCommandOutput and outputHeader and outputFooter:
-            fullOutput = fullOutput.split(cmdsWithSemiColons, 1)[1]
-            newOutput = fullOutput.split(outputHeader, 1)[1]
-            fullOutput = newOutput.split(outputFooter, 1)[0]
-
-            fullOutput = outputHeader + '\n' + fullOutput + '\n' + outputFooter
-
         return fullOutput
 
     def _callCommandOnEveryStackFrame(self, cmd):
@@ -158,32 +183,48 @@ class WinDbg(Debugger):
     def _getRawStackTraceForEachFrame(self, formatCode='p'):
         return self._callCommandOnEveryStackFrame('k' + formatCode)
 
-    def _getLineAndWarningForStackTrace(self, index, trace):
+    def _indexFrames(self, trace):
+        ''' walks the given stack trace once, returning a dict of frame index -> (line, warning) '''
+        frames = {}
         warning = False
         for line in trace.splitlines():
-            if not line.strip():
+            line = line.strip()
+            if not line:
                 continue
 
             if 'Stack unwind information not available' in line:
                 warning = True
                 continue
 
-            firstThing = line.split()[0]
+            firstThing = line.split(None, 1)[0]
             try:
-                int(firstThing)
+                index = int(firstThing)
             except ValueError:
                 continue
 
-            if int(firstThing) == index:
-                return line.strip(), warning
+            if index not in frames:
+                frames[index] = (line, warning)
+
+        return frames
 
     def _getVariablesForFrame(self, index):
-        rawOutput = self._callWinDbg([
-            '.frame %d' % index,
-            'dv /t *',
-        ])
+        return self._getVariablesForFrames([index]).get(index, [])
 
-        r"""example output
+    def _getVariablesForFrames(self, indexes):
+        ''' gets the variables for all the given frame indexes via a single cdb call.
+        Returns a dict of frame index -> list of variables '''
+        if not indexes:
+            return {}
+
+        commands = []
+        for index in indexes:
+            commands.extend(['.frame %d' % index, 'dv /t *'])
+
+        # every frame ends with the same footer, so get the whole log and split it up via the per-frame markers below.
+        # give each frame the time a single call would have had.
+        rawOutput = self._callWinDbg(commands, getJustCommandOutput=False, timeout=CDB_TIMEOUT_SECONDS * len(indexes))
+
+        r"""example output (repeated for each frame)
         == Start Calling .frame 0 ==
 
         00 010ffc14 00889ad9 TheCrasher!main+0x1b [c:\users\cmachalo\documents\visual studio 2015\projects\thecrasher\thecrasher\source.cpp @ 43]
@@ -196,26 +237,36 @@ class WinDbg(Debugger):
         == End Calling dv /t * ==
         """
 
-        variables = []
+        matchVariable = REGEX_VARIABLE_FROM_DV_LINE.match
+        variablesForFrames = {index: [] for index in indexes}
+        index = None
+        variables = None
         for line in rawOutput.splitlines():
-            if ' = ' in line:
-                leftAndRight = line.split(' = ', 1)
-                left, right = leftAndRight
-
-                leftSplit = left.split()
-                name = leftSplit[-1]
-                typ = ' '.join(leftSplit[:-1])
-
-                value = right
+            line = line.strip()
+            if line.startswith('== Start Calling .frame '):
+                index = int(line.split('== Start Calling .frame ', 1)[1].split()[0])
+            elif line == '== Start Calling dv /t * ==':
+                # only collect from dv output (the .frame output can contain parameters that look like variables)
+                if index is not None:
+                    variables = variablesForFrames.setdefault(index, [])
+            elif line == '== End Calling dv /t * ==':
+                index = None
+                variables = None
+            elif variables is not None:
+                match = matchVariable(line)
+                if not match:
+                    continue
+
+                value = match['value']
 
                 # 0n syntax is weird. Get rid of it
                 if value.startswith('0n'):
-                    value = int(value.replace('0n', ''))
+                    value = int(value[2:])
 
-                v = Variable(typ, name, value)
+                v = Variable(match['type'], match['name'], value)
                 variables.append(v)
 
-        return variables
+        return variablesForFrames
 
     def _getThreadId(self):
         rawOutput = self._callWinDbg([
@@ -237,14 +288,21 @@ class WinDbg(Debugger):
         rawOutputClean = self._callWinDbg('kcn')
         rawOutputExtended = self._callWinDbg('kpn')
 
-        frames = []
+        cleanFrames = self._indexFrames(rawOutputClean)
+        extendedFrames = self._indexFrames(rawOutputExtended)
 
-        for idx in range(MAX_STACK_DEPTH):
-            x = self._getLineAndWarningForStackTrace(idx, rawOutputClean)
-            if not x:
-                break
+        frameCount = 0
+        while frameCount < MAX_STACK_DEPTH and cleanFrames.get(frameCount):
+            frameCount += 1
+
+        # get all variables at once since each cdb call has a large startup cost
+        variablesForFrames = self._getVariablesForFrames(range(frameCount))
+
+        searchFileAndLine = REGEX_FILE_AND_LINE_FROM_FRAME.search
+        frames = []
 
-            stackLine, warning = x
+        for idx in range(frameCount):
+            stackLine, warning = cleanFrames[idx]
             moduleAndFunction = stackLine.split()[1]
             if '!' in moduleAndFunction:
                 module, function = moduleAndFunction.split('!')
@@ -252,16 +310,15 @@ class WinDbg(Debugger):
                 module = moduleAndFunction
                 function = None
 
-            x = self._getLineAndWarningForStackTrace(idx, rawOutputExtended)
-            extendedStackLine, warning = x
-            match = re.findall(REGEX_FILE_AND_LINE_FROM_FRAME, extendedStackLine)
+            extendedStackLine, warning = extendedFrames[idx]
+            match = searchFileAndLine(extendedStackLine)
             if match:
-                sourceFile, line = match[0]
+                sourceFile, line = match.group(1, 2)
             else:
                 sourceFile = None
                 line = None
 
-            variables = self._getVariablesForFrame(idx)
+            variables = variablesForFrames[idx]
 
             f = Frame(module, idx, function, sourceFile, line, variables=variables, warningAboutCorrectness=warning)
 
@@ -1,7 +1,8 @@
 ''' this contains tests for our windbg debugger '''
 import unittest
+from unittest import mock
 
-from windbg import WinDbg
+from windbg import WinDbg, CDB_TIMEOUT_SECONDS
 from variable import Variable
 
 class _TestWindbg(WinDbg):
@@ -49,6 +50,95 @@ class TestWindbg(unittest.TestCase):
         assert [v for v in variables if v.type == 'char **' and v.value =="0x032053f0" and v.name == 'argv']
         assert [v for v in variables if v.type == 'char *' and v.value =='0x00000000 ""' and v.name == 'p']
 
+    def test_get_variables_for_frames(self):
+        ''' ensures _getVariablesForFrames() splits variables by frame when parsing windbg output '''
+        EXAMPLE_OUTPUT = r"""
+        == Start Calling .frame 0 ==
+
+        00 010ffc14 00889ad9 TheCrasher!main+0x1b [c:\users\cmachalo\documents\visual studio 2015\projects\thecrasher\thecrasher\source.cpp @ 43]
+        == End Calling .frame 0 ==
+        == Start Calling dv /t * ==
+        int argc = 0n1
+        char ** argv = 0x032053f0
+
+        == End Calling dv /t * ==
+        == Start Calling .frame 1 ==
+
+        01 (Inline) -------- TheCrasher!invoke_main+0x1d [f:\dd\vctools\crt\vcstartup\src\startup\exe_common.inl @ 64]
+        == End Calling .frame 1 ==
+        == Start Calling dv /t * ==
+        Unable to enumerate locals, Win32 error 0n318
+
+        == End Calling dv /t * ==
+        == Start Calling .frame 2 ==
+
+        02 010ffc5c 754b8674 TheCrasher!__scrt_common_main_seh(void)+0xf9 [f:\dd\vctools\crt\vcstartup\src\startup\exe_common.inl @ 253]
+        == End Calling .frame 2 ==
+        == Start Calling dv /t * ==
+        bool has_cctor = false
+        int a = 
+        int  b  =  0n3
+
+        == End Calling dv /t * ==
+        """
+        self.windbg._callWinDbg = lambda *args, **kwargs: EXAMPLE_OUTPUT
+
+        variablesForFrames = self.windbg._getVariablesForFrames([0, 1, 2])
+        assert variablesForFrames[0] == [Variable('int', 'argc', 1), Variable('char **', 'argv', '0x032053f0')]
+        assert variablesForFrames[1] == []
+        assert variablesForFrames[2] == [Variable('bool', 'has_cctor', 'false'), Variable('int', 'a', ''), Variable('int', 'b', 3)]
+
+    def test_get_variables_for_frames_from_cdb_log(self):
+        ''' ensures _getVariablesForFrames() gets every frame's variables via _callWinDbg()'s real log handling '''
+        EXAMPLE_LOG = r"""
+Microsoft (R) Windows Debugger Version 10.0.17763.132 X86
+CommandLine: cdb.exe -c "{commands}"
+0:000> {commands}
+== Start Calling .symopt+0x10 ==
+== End Calling .symopt+0x10 ==
+== Start Calling .ecxr ==
+== End Calling .ecxr ==
+== Start Calling .frame 0 ==
+00 010ffc14 00889ad9 TheCrasher!main(int argc = 0n1, char ** argv = 0x032053f0)+0x1b [c:\source.cpp @ 43]
+== End Calling .frame 0 ==
+== Start Calling dv /t * ==
+int argc = 0n1
+== End Calling dv /t * ==
+== Start Calling .frame 1 ==
+01 (Inline) -------- TheCrasher!invoke_main+0x1d [f:\exe_common.inl @ 64]
+== End Calling .frame 1 ==
+== Start Calling dv /t * ==
+Unable to enumerate locals, Win32 error 0n318
+== End Calling dv /t * ==
+== Start Calling .frame 2 ==
+02 010ffc5c 754b8674 TheCrasher!__scrt_common_main_seh(void)+0xf9 [f:\exe_common.inl @ 253]
+== End Calling .frame 2 ==
+== Start Calling dv /t * ==
+bool has_cctor = false
+== End Calling dv /t * ==
+== Start Calling q ==
+quit:
+"""
+        timeouts = []
+
+        def popen(args, **kwargs):
+            ''' helper mock'd subprocess.Popen that writes the log like cdb would '''
+            commands = args[args.index('-c') + 1]
+            with open(args[args.index('-logo') + 1], 'w') as f:
+                f.write(EXAMPLE_LOG.format(commands=commands))
+
+            process = mock.Mock(returncode=0)
+            process.wait.side_effect = lambda timeout: timeouts.append(timeout)
+            return process
+
+        with mock.patch('windbg.subprocess.Popen', side_effect=popen):
+            variablesForFrames = self.windbg._getVariablesForFrames(range(3))
+
+        assert variablesForFrames[0] == [Variable('int', 'argc', 1)]
+        assert variablesForFrames[1] == []
+        assert variablesForFrames[2] == [Variable('bool', 'has_cctor', 'false')]
+        assert timeouts == [3 * CDB_TIMEOUT_SECONDS]
+
     def test_get_stack_trace(self):
         ''' ensures getStackTrace() works properly via parsing windbg output '''
         EXAMPLE_KCN_OUTPUT = r"""
@@ -90,7 +180,7 @@ class TestWindbg(unittest.TestCase):
         A_VARIABLE = Variable('int', 'theInt', 12)
         self.windbg._callWinDbg = callWinDbg
         self.windbg._getThreadId = lambda: 0xf2
-        self.windbg._getVariablesForFrame = lambda *args, **kwargs: [A_VARIABLE]
+        self.windbg._getVariablesForFrames = lambda indexes: {idx: [A_VARIABLE] for idx in indexes}
 
         s = self.windbg.getStackTrace()
 